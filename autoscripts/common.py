@@ -8,9 +8,11 @@ def get_last_run_time_path(script_name, report_folder):
 def write_last_run_time(script_name, report_folder):
     """
     call this at the end of each script
+    the last run time is the mtime of the file, its content is irrelevant
     """
-    with open(get_last_run_time_path(script_name, report_folder), "w") as f:
-        f.write(str(time.time()))
+    filename = get_last_run_time_path(script_name, report_folder)
+    open(filename, "a").close()
+    os.utime(filename, None)
 
 def is_time_to_run(script_name, report_folder, delay_between_run_in_seconds):
     """
@@ -18,10 +20,9 @@ def is_time_to_run(script_name, report_folder, delay_between_run_in_seconds):
     if false, do not run
     """
     filename = get_last_run_time_path(script_name, report_folder)
-    if not os.path.exists(filename):
+    try:
+        last_exe_time = os.stat(filename).st_mtime
+    except FileNotFoundError:
         return True
 
-    current_time = time.time()
-    with open(filename, "r") as f:
-        last_exe_time = float(f.read())
-    return (current_time - last_exe_time) > delay_between_run_in_seconds
\ No newline at end of file
+    return (time.time() - last_exe_time) > delay_between_run_in_seconds
\ No newline at end of file
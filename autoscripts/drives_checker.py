@@ -1,11 +1,29 @@
 import os
+import re
 import subprocess
-import json
+import pickle
+import threading
 import traceback
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 
 from common import is_time_to_run, write_last_run_time
 
+try:
+    # optional, faster parser, same loads() as the stdlib for what we do
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+try:
+    # optional, lazy parser: only the keys read by the extract_* functions are materialized
+    import simdjson
+except ImportError:
+    simdjson = None
+# a simdjson parser is not thread safe, each scan thread reuses its own
+_THREAD_LOCAL_PARSERS = threading.local()
+
 try:
     # this one is ignored so that I don't push my implementation
     from secret_manager_local import get_secret
@@ -28,6 +46,8 @@ you need to implement get_secret() in common.py, or put the password in clear in
 
 SEND_MAIL = True
 
+# SCRIPT_NAME and ONE_DAY_IN_SECS are copied in SCHEDULED_SCRIPTS_BY_BASENAME in the_orchestrator.py,
+# change both places or the orchestrator will start this script on the old schedule
 ONE_DAY_IN_SECS = 24*60*60
 SCRIPT_NAME = "drive_smart_scanner"
 REPORT_DIR = "./reports"
@@ -35,14 +55,25 @@ REPORT_BASENAME = "drive_smart_scanner_report.txt"
 ERROR_LOG_BASENAME = "drive_smart_scanner_error_log.txt"
 REPORT_PATH = os.path.join(REPORT_DIR, REPORT_BASENAME)
 ERROR_LOG_PATH = os.path.join(REPORT_DIR, ERROR_LOG_BASENAME)
+SCAN_CACHE_PATH = os.path.join(REPORT_DIR, "scan_cache.pkl")
+# lists the block devices known to the kernel, changes when a drive is added or removed
+PARTITIONS_PATH = "/proc/partitions"
 
 SMARTCTL_COMMAND = "smartctl"
+# identity + health + attributes only, we never parse the logs that "-a" also reads
+SMARTCTL_READ_FLAGS = ["-i", "-H", "-A", "-j"]
+# text scan lines look like "/dev/sda -d sat # /dev/sda [SAT], ATA device"
+SCAN_OPEN_DEVICE_RE = re.compile(r"^(/dev/\S+)(?:\s+-d\s+(\S+))?")
 
 MAILGUN_API_KEY = None
 MAILGUN_DOMAIN = None
 MAILGUN_FROM = None
 MAILGUN_TO = None
 
+# reused between mails so that only the first one pays for the TLS handshake
+_MAILGUN_SESSION = requests.Session()
+_MAILGUN_SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
 SMART_ATA_TABLE_COLUMNS = [
     ("ID", 5),
     ("Attribute name", 28),
@@ -66,6 +97,7 @@ def init_mail_settings():
     MAILGUN_DOMAIN = get_secret("mailgun_domain")
     MAILGUN_FROM = f"<noreply@{MAILGUN_DOMAIN}>"
     MAILGUN_TO = get_secret("personal_email")
+    _MAILGUN_SESSION.auth = ("api", MAILGUN_API_KEY)
 
 # === ATA drive ===
 # we don't want the 'current' value to go below the treshold
@@ -74,6 +106,8 @@ REPORTED_UNCORRECTABLE_ERRORS_187_BB_ID = 187
 COMMAND_LINE_TIMEOUT_188_BC_ID = 188
 CURRENT_PENDING_SECTOR_COUNT_197_C5_ID = 197
 OFFLINE_UNCORRECTABLE_198_C6_ID = 198
+# same order as SMART_ATA_TABLE_COLUMNS
+ATA_ATTRIBUTE_FIELDS = ("id", "name", "current", "worst", "threshold", "raw")
 # more conservative than regular tresholds
 DANGEROUS_ATA_TRESHOLDS_BY_ID = {
     REALLOCATED_SECTOR_COUNT_5_ID: 60,
@@ -97,31 +131,40 @@ DANGEROUS_NVME_TRESHOLDS_BY_NAME = {
 def is_hdd(report):
     return report["identity"]["interface"].lower() == "ata"
 
-def format_table_row(values, widths):
-    padded_values = []
-    for value, width in zip(values, widths):
-        text = str(value) if value is not None else "-"
-        padded_values.append(text.ljust(width))
-    return "| " + " | ".join(padded_values) + " |\n"
+def get_table_row_format(widths):
+    """
+    built once per table, each row is then a single str.format call
+    """
+    return "| " + " | ".join(f"{{:<{width}}}" for width in widths) + " |\n"
+
+def format_table_row(row_format, values):
+    # str() first : format() would print bools as ints and fails on lists with a width
+    return row_format.format(*(str(value) if value is not None else "-" for value in values))
 
 def write_error_log(lines):
     with open(ERROR_LOG_PATH, "a", encoding="utf-8") as f:
         for line in lines:
             f.write(line+"\n")
 
-def run_command(command_args):
+def run_command(command_args, text=True):
+    """
+    text=False returns stdout as bytes
+    """
     process = subprocess.run(
         command_args,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        text=True
+        text=text
     )
 
-    stdout = process.stdout or ""
-    stderr = process.stderr or ""
+    stdout = process.stdout or ("" if text else b"")
+    stderr = process.stderr or ("" if text else b"")
 
     # smartctl often returns non-zero for warnings → accept if stdout exists
     if process.returncode != 0 and not stdout.strip():
+        if not text:
+            stdout = stdout.decode(errors="replace")
+            stderr = stderr.decode(errors="replace")
         raise RuntimeError(
             f"Command failed with return code {process.returncode}: "
             f"{' '.join(command_args)}"
@@ -136,22 +179,109 @@ def power_on_years_from_hours(power_on_hours):
         return None
     return round(power_on_hours / (24 * 365), 2)
 
+def get_drive_topology_key():
+    """
+    cheap way to know if the drives changed since the last scan
+    returns None when there is no way to know (windows), meaning always rescan
+    """
+    # procfs mtimes are not updated when the content changes, so compare the content itself
+    try:
+        with open(PARTITIONS_PATH, "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def read_scan_cache(key):
+    try:
+        with open(SCAN_CACHE_PATH, "rb") as f:
+            cache = pickle.load(f)
+        if cache["key"] == key:
+            return cache["drives"]
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError):
+        # missing or unreadable cache, scan again
+        pass
+    return None
+
+def write_scan_cache(key, drives):
+    with open(SCAN_CACHE_PATH, "wb") as f:
+        pickle.dump({"key": key, "drives": drives}, f)
+
 def list_physical_drives():
+    """
+    same as scan_physical_drives but skips the scan when the drives did not change since the last run
+    """
+    key = get_drive_topology_key()
+    if key is None:
+        return scan_physical_drives()
+
+    drives = read_scan_cache(key)
+    if drives is None:
+        drives = scan_physical_drives()
+        # no drive usually means smartctl could not open them (not elevated), don't keep that
+        if drives:
+            write_scan_cache(key, drives)
+    return drives
+
+def scan_physical_drives():
+    """
+    returns a list of (drive_path, device_type)
+    device_type is what smartctl detected during the scan (sat, nvme, ...), it is passed back
+    with -d so that smartctl does not have to probe the drive again
+    """
+    try:
+        output = run_command([SMARTCTL_COMMAND, "--scan-open", "-j"])
+        devices = _json.loads(output).get("devices", [])
+    except (RuntimeError, ValueError):
+        # smartctl before 7.0 has no json output
+        return scan_physical_drives_text()
+
+    drives = []
+    for device in devices:
+        # devices smartctl could not open are listed too, the text scan comments them out
+        if "open_error" in device:
+            continue
+        drives.append((device["name"], device.get("type")))
+    return drives
+
+def scan_physical_drives_text():
     output = run_command([SMARTCTL_COMMAND, "--scan-open"])
     drives = []
     for line in output.splitlines():
-        if line.startswith("/dev/"):
-            drives.append(line.split()[0])
+        match = SCAN_OPEN_DEVICE_RE.match(line)
+        if match:
+            drives.append((match.group(1), match.group(2)))
     return drives
 
-def read_drive_json(drive_path):
-    output = run_command([
-        SMARTCTL_COMMAND,
-        "-a",
-        "-j",
-        drive_path
-    ])
-    return json.loads(output)
+def parse_drive_json(raw):
+    """
+    with simdjson the result is only valid until the next parse in the same thread,
+    the extract_* functions copy what they need so don't keep it around
+    """
+    if simdjson is None:
+        return _json.loads(raw)
+
+    parser = getattr(_THREAD_LOCAL_PARSERS, "parser", None)
+    if parser is None:
+        parser = simdjson.Parser()
+        _THREAD_LOCAL_PARSERS.parser = parser
+    return parser.parse(raw)
+
+def read_drive_json(drive_path, flags):
+    """
+    stdout is kept as bytes, the parsers accept bytes so there is no decode step
+    """
+    output = run_command([SMARTCTL_COMMAND] + flags + [drive_path], text=False)
+    try:
+        data = parse_drive_json(output)
+    except ValueError:
+        # orjson and simdjson parse errors are ValueErrors too
+        data = None
+
+    # smartctl often returns non-zero for warnings → accept if we got some json
+    if not data:
+        raise RuntimeError(f"smartctl returned no usable json for {drive_path}")
+
+    return data
 
 def extract_identity(data):
     return {
@@ -176,17 +306,18 @@ def extract_power_info(data):
     return power_on_hours, power_on_count
 
 def extract_smart_attributes_ata(data):
-    attributes = []
+    """
+    returns one list per field (see ATA_ATTRIBUTE_FIELDS), index i of each list is the i-th attribute
+    """
+    attributes = {field: [] for field in ATA_ATTRIBUTE_FIELDS}
     if "ata_smart_attributes" in data:
         for attr in data["ata_smart_attributes"]["table"]:
-            attributes.append({
-                "id": attr["id"],
-                "name": attr["name"],
-                "current": attr["value"],
-                "worst": attr["worst"],
-                "threshold": attr.get("thresh", None),
-                "raw": attr["raw"]["value"],
-            })
+            attributes["id"].append(attr["id"])
+            attributes["name"].append(attr["name"])
+            attributes["current"].append(attr["value"])
+            attributes["worst"].append(attr["worst"])
+            attributes["threshold"].append(attr.get("thresh", None))
+            attributes["raw"].append(attr["raw"]["value"])
     return attributes
 
 def extract_smart_attribute_nvme(data):
@@ -203,13 +334,16 @@ def extract_smart_attribute_nvme(data):
 def detect_issues_ata(attributes):
     issues = []
 
-    for attr in attributes:
-        if isinstance(attr["id"], int):
-            if attr["id"] in DANGEROUS_ATA_TRESHOLDS_BY_ID:
-                if attr["current"] < DANGEROUS_ATA_TRESHOLDS_BY_ID[attr["id"]]:
-                    issues.append(attr)
-                elif attr["raw"] > 0:
-                    issues.append(attr)
+    current_values = attributes["current"]
+    raw_values = attributes["raw"]
+    for index, attr_id in enumerate(attributes["id"]):
+        # one lookup per attribute, most ids are not watched
+        treshold = DANGEROUS_ATA_TRESHOLDS_BY_ID.get(attr_id)
+        if treshold is None:
+            continue
+        if current_values[index] < treshold or raw_values[index] > 0:
+            # only the issues are rebuilt as dicts, they end up in the mail
+            issues.append({field: attributes[field][index] for field in ATA_ATTRIBUTE_FIELDS})
 
     return issues
 
@@ -223,76 +357,93 @@ def detect_issues_nvme(attributes):
 
     return issues
 
-def write_common_report_info(file, report):
-    file.write(f"disk family : {report['identity']['disk_family']}\n")
-    file.write(f"disk name : {report['identity']['disk_name']}\n")
-    file.write(f"disk letter : {report['drive_path']}\n")
-    file.write(f"firmware version : {report['identity']['firmware_version']}\n")
-    file.write(f"serial number : {report['identity']['serial_number']}\n")
-    file.write(f"disk name interface : {report['identity']['interface']}\n")
-    file.write(f"power on count : {report['power_on_count']}\n")
-    file.write(f"power on hours : {report['power_on_hours']}\n")
-    file.write(f"power on years : {report['power_on_years']}\n")
-    file.write(f"smart status is ok (according to smartctl) : {report['identity']['smart_status']}\n\n")
-
-def write_ata_smart_report_info(file, report):
-    file.write("SMART :\n\n")
-    file.write("current : 0-100 score, higher is better\n")
-    file.write("worst : historical minimum of 'current'\n")
-    file.write("threshold : if current goes below that then it's bad\n")
-    file.write("raw values : the actual value\n\n")
+REPORT_FILE_BUFFER_SIZE = 1 << 16
+
+def build_common_report_info(report):
+    return [
+        f"disk family : {report['identity']['disk_family']}\n",
+        f"disk name : {report['identity']['disk_name']}\n",
+        f"disk letter : {report['drive_path']}\n",
+        f"firmware version : {report['identity']['firmware_version']}\n",
+        f"serial number : {report['identity']['serial_number']}\n",
+        f"disk name interface : {report['identity']['interface']}\n",
+        f"power on count : {report['power_on_count']}\n",
+        f"power on hours : {report['power_on_hours']}\n",
+        f"power on years : {report['power_on_years']}\n",
+        f"smart status is ok (according to smartctl) : {report['identity']['smart_status']}\n\n",
+    ]
+
+def build_ata_smart_report_info(report):
+    parts = [
+        "SMART :\n\n",
+        "current : 0-100 score, higher is better\n",
+        "worst : historical minimum of 'current'\n",
+        "threshold : if current goes below that then it's bad\n",
+        "raw values : the actual value\n\n",
+    ]
     headers = [col[0] for col in SMART_ATA_TABLE_COLUMNS]
     widths = [col[1] for col in SMART_ATA_TABLE_COLUMNS]
+    row_format = get_table_row_format(widths)
 
-    file.write(format_table_row(headers, widths))
-    file.write(format_table_row(["-" * w for w in widths], widths))
+    parts.append(format_table_row(row_format, headers))
+    parts.append(format_table_row(row_format, ["-" * w for w in widths]))
 
-    for attr in report["attributes"]:
-        row = [
-            attr["id"],
-            attr["name"],
-            attr["current"],
-            attr["worst"],
-            attr["threshold"],
-            attr["raw"],
-        ]
-        file.write(format_table_row(row, widths))
+    attributes = report["attributes"]
+    for row in zip(*(attributes[field] for field in ATA_ATTRIBUTE_FIELDS)):
+        parts.append(format_table_row(row_format, row))
 
-    file.write("\n")
+    parts.append("\n")
+    return parts
 
-def write_nvme_smart_report_info(file, report):
-    file.write("SMART :\n\n")
-    file.write("lower is better\n\n")
+def build_nvme_smart_report_info(report):
+    parts = [
+        "SMART :\n\n",
+        "lower is better\n\n",
+    ]
     headers = [col[0] for col in SMART_NVME_TABLE_COLUMNS]
     widths = [col[1] for col in SMART_NVME_TABLE_COLUMNS]
+    row_format = get_table_row_format(widths)
 
-    file.write(format_table_row(headers, widths))
-    file.write(format_table_row(["-" * w for w in widths], widths))
+    parts.append(format_table_row(row_format, headers))
+    parts.append(format_table_row(row_format, ["-" * w for w in widths]))
 
     for attr in report["attributes"]:
         row = [
             attr["name"],
             attr["value"],
         ]
-        file.write(format_table_row(row, widths))
+        parts.append(format_table_row(row_format, row))
 
-    file.write("\n")
+    parts.append("\n")
+    return parts
 
 def write_report(drive_reports):
-    with open(REPORT_PATH, "w", encoding="utf-8") as file:
+    """
+    each drive section is built as a list of strings and written with a single writelines
+    """
+    with open(REPORT_PATH, "w", encoding="utf-8", buffering=REPORT_FILE_BUFFER_SIZE) as file:
         for index, report in enumerate(drive_reports, start=1):
-            file.write(f"{'-' * 28} DRIVE {index} {'-' * 28}\n")
-
-            write_common_report_info(file, report)
+            parts = [f"{'-' * 28} DRIVE {index} {'-' * 28}\n"]
+            parts += build_common_report_info(report)
             if is_hdd(report):
-                write_ata_smart_report_info(file, report)
+                parts += build_ata_smart_report_info(report)
             else:
-                write_nvme_smart_report_info(file, report)
+                parts += build_nvme_smart_report_info(report)
+            file.writelines(parts)
+
+def build_issues_mail_body(global_issues):
+    """
+    one block per drive, each block is built with a single join
+    """
+    body_parts = ["SMART issues detected:\n"] + [
+        f"Drive {drive_path}, type {drive_type}:\n" + "\n".join(f" - {issue}" for issue in issues) + "\n"
+        for drive_type, drive_path, issues in global_issues
+    ]
+    return "\n".join(body_parts)
 
 def send_mail(subject, body):
-    response = requests.post(
+    response = _MAILGUN_SESSION.post(
         f"https://api.mailgun.net/v3/{MAILGUN_DOMAIN}/messages",
-        auth=("api", MAILGUN_API_KEY),
         data={
             "from": MAILGUN_FROM,
             "to": MAILGUN_TO,
@@ -305,57 +456,71 @@ def send_mail(subject, body):
     if response.status_code != 200:
         raise RuntimeError(f"Mailgun error: {response.text}")
 
+MAX_SCAN_WORKERS = 8
+
+def scan_one(drive, path_lock):
+    """
+    reads and analyses a single drive, drive is a (drive_path, device_type) from list_physical_drives
+    path_lock is shared by the drives that have the same path
+    returns (report, issue entry or None)
+    """
+    drive_path, device_type = drive
+    flags = list(SMARTCTL_READ_FLAGS)
+    if device_type:
+        flags += ["-d", device_type]
+    # drives behind a raid controller (-d megaraid,N) all share a path like /dev/bus/0,
+    # don't send concurrent smartctl calls to the same controller
+    with path_lock:
+        data = read_drive_json(drive_path, flags)
+
+    identity = extract_identity(data)
+    power_on_hours, power_on_count = extract_power_info(data)
+    power_on_years = power_on_years_from_hours(power_on_hours)
+    issue_entry = None
+    if identity["interface"].lower() == "ata":
+        attributes = extract_smart_attributes_ata(data)
+        issues = detect_issues_ata(attributes)
+        if issues:
+            issue_entry = ["ATA", drive_path, issues]
+    else:
+        attributes = extract_smart_attribute_nvme(data)
+        issues = detect_issues_nvme(attributes)
+        if issues:
+            issue_entry = ["NVME", drive_path, issues]
+
+    report = {
+        "drive_path": drive_path,
+        "identity": identity,
+        "power_on_hours": power_on_hours,
+        "power_on_count": power_on_count,
+        "power_on_years": power_on_years,
+        "attributes": attributes,
+    }
+    return report, issue_entry
+
 def main():
     os.makedirs(REPORT_DIR, exist_ok=True)
     init_mail_settings()
-    drive_paths = list_physical_drives()
+    drives = list_physical_drives()
     drive_reports = []
     global_issues = []
-    for drive_path in drive_paths:
-        data = read_drive_json(drive_path)
-
-        identity = extract_identity(data)
-        power_on_hours, power_on_count = extract_power_info(data)
-        power_on_years = power_on_years_from_hours(power_on_hours)
-        if identity["interface"].lower() == "ata":
-            attributes = extract_smart_attributes_ata(data)
-            issues = detect_issues_ata(attributes)
-            if issues:
-                global_issues.append(
-                    ["ATA", drive_path, issues]
-                )
-        else:
-            attributes = extract_smart_attribute_nvme(data)
-            issues = detect_issues_nvme(attributes)
-            if issues:
-                global_issues.append(
-                    ["NVME", drive_path, issues]
-                )
-
-        drive_reports.append({
-            "drive_path": drive_path,
-            "identity": identity,
-            "power_on_hours": power_on_hours,
-            "power_on_count": power_on_count,
-            "power_on_years": power_on_years,
-            "attributes": attributes,
-        })
+    if drives:
+        # smartctl spends its time blocked on the drive, so threads are enough
+        # ex.map keeps the results in the same order as drives
+        path_locks = {drive_path: threading.Lock() for drive_path, _ in drives}
+        with ThreadPoolExecutor(max_workers=min(MAX_SCAN_WORKERS, len(drives))) as ex:
+            results = list(ex.map(lambda drive: scan_one(drive, path_locks[drive[0]]), drives))
+        for report, issue_entry in results:
+            drive_reports.append(report)
+            if issue_entry:
+                global_issues.append(issue_entry)
 
     write_report(drive_reports)
 
     if global_issues and SEND_MAIL:
-        lines = ["SMART issues detected:\n"]
-        for drive_type, drive_path, issues in global_issues:
-            lines.append(f"Drive {drive_path}, type {drive_type}:")
-            for issue in issues:
-                lines.append(
-                    f" - {issue}"
-                )
-            lines.append("")
-
         send_mail(
             subject="⚠ SMART issues detected on your system",
-            body="\n".join(lines)
+            body=build_issues_mail_body(global_issues)
         )
 
 
@@ -1,8 +1,13 @@
 import os
 import sys
+import argparse
+import threading
 import subprocess
 import datetime
-from typing import List, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Optional, TextIO
+
+from autoscripts.common import is_time_to_run
 
 AUTOSCRIPTS_DIRNAME = "autoscripts"
 ORCHESTRATOR_LOGS_DIRNAME = "orchestrator_logs"
@@ -16,6 +21,17 @@ SKIP_PYTHON_BASENAMES_SET = {
 
 SCRIPT_TIMEOUT_SECS = 55 * 60  # keep under 1 hour to avoid overlapping scheduled runs
 
+DEFAULT_PARALLEL_SCRIPTS = 4  # most scripts wait on the network or on drives, use --parallel 1 to debug
+
+AUTOSCRIPTS_REPORTS_DIRNAME = "reports"
+
+# basename -> (script name passed to is_time_to_run, delay between runs in seconds)
+# must match the values used inside each script (drives_checker.py: SCRIPT_NAME, ONE_DAY_IN_SECS),
+# scripts not listed here are always started
+SCHEDULED_SCRIPTS_BY_BASENAME = {
+    "drives_checker.py": ("drive_smart_scanner", 24 * 60 * 60),
+}
+
 def now_timestamp_for_filename() -> str:
     # Windows-safe timestamp (no ":" characters)
     return datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
@@ -26,7 +42,8 @@ def ensure_dir_exists(dir_path: str) -> None:
 def list_python_file_paths_in_dir(autoscripts_dir: str) -> List[str]:
     """
     Returns absolute file paths of all .py files directly inside autoscripts_dir
-    (non-recursive), excluding SKIP_PYTHON_BASENAMES_SET.
+    (non-recursive), excluding SKIP_PYTHON_BASENAMES_SET and hidden/underscore files.
+    The extension check is case-sensitive, scripts must end with ".py".
     Uses os.scandir for speed.
     """
     python_file_paths: List[str] = []
@@ -36,48 +53,71 @@ def list_python_file_paths_in_dir(autoscripts_dir: str) -> List[str]:
             for entry in entries:
                 entry_name = entry.name
 
-                if not entry.is_file(follow_symlinks=False):
+                # name checks first, they are cheaper than is_file which may need a stat
+                if entry_name.startswith((".", "_")):
                     continue
 
-                if not entry_name.lower().endswith(".py"):
+                if not entry_name.endswith(".py"):
                     continue
 
                 if entry_name in SKIP_PYTHON_BASENAMES_SET:
                     continue
 
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+
                 python_file_paths.append(entry.path)
     except PermissionError as exc:
         raise PermissionError(f"Permission denied while scanning: {autoscripts_dir}") from exc
 
-    python_file_paths.sort(key=lambda path: os.path.basename(path).lower())
     return python_file_paths
 
+def describe_scripts(python_file_paths: List[str]) -> List[Tuple[str, str, str]]:
+    """
+    Returns (abs_path, basename, stem) for each script, sorted by basename (case-insensitive).
+    Paths are parsed once here instead of in every place that needs a name.
+    """
+    scripts: List[Tuple[str, str, str]] = []
+    for script_abs_path in python_file_paths:
+        script_basename = os.path.basename(script_abs_path)
+        scripts.append((script_abs_path, script_basename, os.path.splitext(script_basename)[0]))
+
+    scripts.sort(key=lambda script: script[1].lower())
+    return scripts
+
+def write_lines(file: TextIO, lines: List[str]) -> None:
+    # single write, every line ends with exactly the "\n" it had or one added
+    file.write("".join(line if line.endswith("\n") else line + "\n" for line in lines))
+
 def write_text_file(file_path: str, lines: List[str]) -> None:
     with open(file_path, "w", encoding="utf-8") as file:
-        for line in lines:
-            file.write(line)
-            if not line.endswith("\n"):
-                file.write("\n")
+        write_lines(file, lines)
 
 def append_text_file(file_path: str, lines: List[str]) -> None:
     with open(file_path, "a", encoding="utf-8") as file:
-        for line in lines:
-            file.write(line)
-            if not line.endswith("\n"):
-                file.write("\n")
+        write_lines(file, lines)
+
+def is_script_due(script_basename: str, autoscripts_root_dir: str) -> bool:
+    """
+    Same check the script does itself, done here to avoid starting a python process for nothing.
+    """
+    if script_basename not in SCHEDULED_SCRIPTS_BY_BASENAME:
+        return True
+
+    script_name, delay_between_run_in_seconds = SCHEDULED_SCRIPTS_BY_BASENAME[script_basename]
+    reports_dir = os.path.join(autoscripts_root_dir, AUTOSCRIPTS_REPORTS_DIRNAME)
+    return is_time_to_run(script_name, reports_dir, delay_between_run_in_seconds)
 
 def run_script(
     script_abs_path: str,
+    script_stem: str,
     autoscripts_root_dir: str,
     logs_dir: str,
 ) -> Tuple[int, Optional[str], Optional[str], float]:
     """
-    Runs one script as a subprocess.
+    Runs one script as a subprocess, its stdout/stderr go straight to the log files.
     Returns: (return_code, stdout_log_path, stderr_log_path, duration_secs)
     """
-    script_basename = os.path.basename(script_abs_path)
-    script_stem = os.path.splitext(script_basename)[0]
-
     stdout_log_path = os.path.join(logs_dir, f"{script_stem}.stdout.txt")
     stderr_log_path = os.path.join(logs_dir, f"{script_stem}.stderr.txt")
 
@@ -85,25 +125,24 @@ def run_script(
 
     start_time = datetime.datetime.now()
     try:
-        process = subprocess.run(
-            command_args,
-            cwd=autoscripts_root_dir,  # important: keeps ./reports working
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            timeout=SCRIPT_TIMEOUT_SECS,
-        )
+        # no PIPE : the output is never held in the orchestrator's memory, however big it is
+        with open(stdout_log_path, "wb") as stdout_file, open(stderr_log_path, "wb") as stderr_file:
+            process = subprocess.run(
+                command_args,
+                cwd=autoscripts_root_dir,  # important: keeps ./reports working
+                stdout=stdout_file,
+                stderr=stderr_file,
+                timeout=SCRIPT_TIMEOUT_SECS,
+            )
         duration_secs = (datetime.datetime.now() - start_time).total_seconds()
 
-        write_text_file(stdout_log_path, [process.stdout or ""])
-        write_text_file(stderr_log_path, [process.stderr or ""])
-
         return process.returncode, stdout_log_path, stderr_log_path, duration_secs
 
-    except subprocess.TimeoutExpired as exc:
+    except subprocess.TimeoutExpired:
+        # the child was killed by subprocess.run, what it printed is already in the files
         duration_secs = (datetime.datetime.now() - start_time).total_seconds()
-        write_text_file(stdout_log_path, [(exc.stdout or ""), "\n[orchestrator] TIMEOUT\n"])
-        write_text_file(stderr_log_path, [(exc.stderr or ""), "\n[orchestrator] TIMEOUT\n"])
+        append_text_file(stdout_log_path, ["\n[orchestrator] TIMEOUT\n"])
+        append_text_file(stderr_log_path, ["\n[orchestrator] TIMEOUT\n"])
         return 124, stdout_log_path, stderr_log_path, duration_secs
 
     except Exception as exc:
@@ -112,7 +151,58 @@ def run_script(
         write_text_file(stderr_log_path, [f"[orchestrator] Exception while running {script_abs_path}: {exc}"])
         return 125, stdout_log_path, stderr_log_path, duration_secs
 
-def main() -> int:
+def run_and_log_script(
+    script: Tuple[str, str, str],
+    autoscripts_root_dir: str,
+    run_logs_dir: str,
+    run_log_file: TextIO,
+    run_log_lock: threading.Lock,
+) -> Tuple[str, bool]:
+    """
+    Runs one script (unless it is not due) and writes its lines to the run log.
+    Safe to call from several threads, run log writes are done under run_log_lock.
+    Never raises, an exception is reported as a FAILED result line.
+    Returns: (result_line, failed)
+    """
+    script_abs_path, script_basename, script_stem = script
+
+    try:
+        if not is_script_due(script_basename, autoscripts_root_dir):
+            result_line = f"SKIPPED (not due) script={script_basename}"
+            with run_log_lock:
+                write_lines(run_log_file, [result_line, ""])
+            return result_line, False
+
+        with run_log_lock:
+            write_lines(run_log_file, [f"== Running: {script_basename} =="])
+
+        return_code, stdout_log_path, stderr_log_path, duration_secs = run_script(
+            script_abs_path=script_abs_path,
+            script_stem=script_stem,
+            autoscripts_root_dir=autoscripts_root_dir,
+            logs_dir=run_logs_dir,
+        )
+
+        status = "OK" if return_code == 0 else "FAILED"
+        result_line = (
+            f"{status} rc={return_code} duration={duration_secs:.2f}s "
+            f"script={script_basename} "
+            f"stdout={os.path.basename(stdout_log_path)} "
+            f"stderr={os.path.basename(stderr_log_path)}"
+        )
+
+        with run_log_lock:
+            write_lines(run_log_file, [result_line, ""])
+        return result_line, return_code != 0
+
+    except Exception as exc:
+        # same as a failed script, the other scripts and the summary must still happen
+        result_line = f"FAILED script={script_basename} orchestrator exception: {exc!r}"
+        with run_log_lock:
+            write_lines(run_log_file, [result_line, ""])
+        return result_line, True
+
+def main(parallel_scripts: int = DEFAULT_PARALLEL_SCRIPTS) -> int:
     orchestrator_dir = os.path.dirname(os.path.abspath(__file__))
     autoscripts_root_dir = os.path.join(orchestrator_dir, AUTOSCRIPTS_DIRNAME)
 
@@ -129,65 +219,76 @@ def main() -> int:
     orchestrator_run_log_path = os.path.join(run_logs_dir, "orchestrator_run_log.txt")
     last_summary_path = os.path.join(logs_root_dir, "last_run_summary.txt")
 
-    python_file_paths = list_python_file_paths_in_dir(autoscripts_root_dir)
+    scripts = describe_scripts(list_python_file_paths_in_dir(autoscripts_root_dir))
 
     header_lines = [
         f"Orchestrator started: {run_timestamp}",
         f"Python executable: {sys.executable}",
         f"autoscripts root: {autoscripts_root_dir}",
-        f"Found scripts: {len(python_file_paths)}",
+        f"Found scripts: {len(scripts)}",
         "",
         "Scripts to run (in order):",
     ]
-    for script_path in python_file_paths:
-        header_lines.append(f" - {os.path.basename(script_path)}")
+    for _, script_basename, _ in scripts:
+        header_lines.append(f" - {script_basename}")
     header_lines.append("")
 
-    write_text_file(orchestrator_run_log_path, header_lines)
-
-    any_failures = False
     results_lines: List[str] = ["Results:"]
-
-    for script_abs_path in python_file_paths:
-        script_basename = os.path.basename(script_abs_path)
-        append_text_file(orchestrator_run_log_path, [f"== Running: {script_basename} =="])
-
-        return_code, stdout_log_path, stderr_log_path, duration_secs = run_script(
-            script_abs_path=script_abs_path,
-            autoscripts_root_dir=autoscripts_root_dir,
-            logs_dir=run_logs_dir,
-        )
-
-        status = "OK" if return_code == 0 else "FAILED"
-        if return_code != 0:
-            any_failures = True
-
-        result_line = (
-            f"{status} rc={return_code} duration={duration_secs:.2f}s "
-            f"script={script_basename} "
-            f"stdout={os.path.basename(stdout_log_path)} "
-            f"stderr={os.path.basename(stderr_log_path)}"
-        )
-
-        append_text_file(orchestrator_run_log_path, [result_line, ""])
-        results_lines.append(result_line)
-
-    footer_lines = [
-        "",
-        f"Orchestrator finished: {now_timestamp_for_filename()}",
-        f"Overall status: {'FAILED' if any_failures else 'OK'}",
-        f"Run log: {orchestrator_run_log_path}",
-    ]
-    append_text_file(orchestrator_run_log_path, footer_lines)
+    run_log_lock = threading.Lock()
+
+    # one handle for the whole run, line buffered so the log is up to date if a script hangs
+    with open(orchestrator_run_log_path, "w", encoding="utf-8", buffering=1) as run_log_file:
+        write_lines(run_log_file, header_lines)
+
+        # the run log gets lines in completion order, ex.map keeps the summary in script order
+        with ThreadPoolExecutor(max_workers=parallel_scripts) as executor:
+            results = list(executor.map(
+                lambda script: run_and_log_script(
+                    script=script,
+                    autoscripts_root_dir=autoscripts_root_dir,
+                    run_logs_dir=run_logs_dir,
+                    run_log_file=run_log_file,
+                    run_log_lock=run_log_lock,
+                ),
+                scripts,
+            ))
+
+        any_failures = False
+        for result_line, failed in results:
+            results_lines.append(result_line)
+            if failed:
+                any_failures = True
+
+        footer_lines = [
+            "",
+            f"Orchestrator finished: {now_timestamp_for_filename()}",
+            f"Overall status: {'FAILED' if any_failures else 'OK'}",
+            f"Run log: {orchestrator_run_log_path}",
+        ]
+        write_lines(run_log_file, footer_lines)
 
     summary_lines = header_lines + results_lines + footer_lines
     write_text_file(last_summary_path, summary_lines)
 
     return 1 if any_failures else 0
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Runs every script in the autoscripts folder")
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=DEFAULT_PARALLEL_SCRIPTS,
+        help=f"how many scripts can run at the same time, 1 runs them one after the other (default: {DEFAULT_PARALLEL_SCRIPTS})",
+    )
+    args = parser.parse_args()
+    if args.parallel < 1:
+        parser.error(f"--parallel must be at least 1, got {args.parallel}")
+    return args
+
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        exit_code = main()
+        exit_code = main(parallel_scripts=args.parallel)
         raise SystemExit(exit_code)
     except Exception as exc:
         orchestrator_dir = os.path.dirname(os.path.abspath(__file__))